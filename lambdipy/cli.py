@@ -3,6 +3,8 @@ from . import __version__
 import glob
 import os
 import sys
+import time
+import traceback
 
 
 from docker.errors import BuildError
@@ -12,14 +14,21 @@ from .package_build import PackageBuild, build_package_build_dict
 from .project_build import get_requirements_from_pipenv, parse_requirements, resolve_requirements
 from .project_build import prepare_resolved_requirements, copy_prepared_releases_to_build_directory
 from .project_build import install_non_resolved_requirements, copy_include_paths
-from .project_build import NoReleaseCandidate, ReleaseRequirementsMissmatched
-from .release import get_release, release as release_package
+from .project_build import BuildScriptFailed, NoReleaseCandidate, ReleaseRequirementsMissmatched
+from .mirror import sync_mirror
+from .release import get_release, get_release_recipe_hash, release as release_package
+from .tree_shaking import prune_unreachable_packages
+from .watch import ProjectWatcher
+from .zip_packing import pack_zip_safe_packages
 
 
 import warnings
 warnings.filterwarnings("ignore")
 
 
+WATCH_INTERVAL = 0.5
+
+
 @click.group()
 def cli():
     """A tool for building and packaging python packages for AWS Lambda."""
@@ -31,6 +40,12 @@ def version():
     print(__version__)
 
 
+def _python_version():
+    if os.environ.get('PYTHON_VERSION', False):
+        return os.environ.get('PYTHON_VERSION')
+    return f'{sys.version_info.major}.{sys.version_info.minor}'
+
+
 # TODO: allow configuration
 #  - custom build folder
 #  - override build recipes
@@ -47,28 +62,78 @@ def version():
 @click.option('--keep-tests', '-t', multiple=True, help='Exclude deletions of tests for these packages')
 @click.option('--no-docker', '-x', is_flag=True, help='Do not use Docker for package build (lambdipy itself runs in '
                                                       'lambci/lambda:build-python{PYTHON_VERSION} container)')
-def build(from_pipenv, dev, include, keep_tests, no_docker):
-    if from_pipenv:
-        requirements = parse_requirements(get_requirements_from_pipenv(dev))
-    else:
-        requirements = parse_requirements(open('requirements.txt').read())
-
-    if os.environ.get('PYTHON_VERSION', False):
-        python_version = os.environ.get('PYTHON_VERSION')
-    else:
-        python_version = f'{sys.version_info.major}.{sys.version_info.minor}'
+@click.option('--mirror', '-m', envvar='LAMBDIPY_MIRROR', help='Directory or HTTP URL of a release mirror populated '
+                                                               'by `lambdipy mirror sync`, used instead of GitHub')
+@click.option('--watch', '-w', is_flag=True, help='Keep running and apply changes of requirements and included paths '
+                                                  'to the build incrementally')
+@click.option('--zip-packages', '-z', is_flag=True, help='Pack pure python packages into a zip archive imported via '
+                                                        'zipimport to reduce the number of files in the build')
+@click.option('--verify-zip', is_flag=True, help='Verify that every package packed by --zip-packages can be imported '
+                                                 'from the zip archive')
+def build(from_pipenv, dev, include, keep_tests, no_docker, mirror, watch, zip_packages, verify_zip):
+    if watch and zip_packages:
+        raise click.UsageError('--zip-packages can\'t be combined with --watch')
+    if verify_zip and not zip_packages:
+        raise click.UsageError('--verify-zip requires --zip-packages')
+
+    def load_requirements():
+        if from_pipenv:
+            return parse_requirements(get_requirements_from_pipenv(dev))
+        else:
+            return parse_requirements(open('requirements.txt').read())
 
+    python_version = _python_version()
     release_paths = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'releases/**/**/build*python{python_version}*json')
     package_builds = build_package_build_dict(glob.glob(release_paths))
 
-    try:
+    if watch:
+        requirements_paths = ['Pipfile.lock'] if from_pipenv else ['requirements.txt']
+        watcher = ProjectWatcher(load_requirements, requirements_paths, include, package_builds, python_version,
+                                 keep_tests=keep_tests, no_docker=no_docker, mirror=mirror)
+        try:
+            _run_watch_step(watcher.build, package_builds)
+            print('Watching for changes, press Ctrl+C to stop')
+            while True:
+                time.sleep(WATCH_INTERVAL)
+                _run_watch_step(watcher.update, package_builds)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+        return
+
+    def run_build():
+        requirements = load_requirements()
         resolved_requirements = resolve_requirements(requirements, package_builds)
-        package_paths = prepare_resolved_requirements(resolved_requirements)
+        package_paths = prepare_resolved_requirements(resolved_requirements, mirror=mirror)
         copy_prepared_releases_to_build_directory(package_paths)
         install_non_resolved_requirements(resolved_requirements, requirements, python_version, keep_tests, no_docker)
+        if zip_packages:
+            pack_zip_safe_packages(python_version, no_docker=no_docker, verify=verify_zip)
         copy_include_paths(include)
         print('Build done')
 
+    try:
+        _run_build_step(run_build, package_builds)
+    except BuildScriptFailed as e:
+        print("Error in building lambdipy build.")
+        exit(e.return_code)
+
+
+def _run_watch_step(step, package_builds):
+    # Failures are reported and watching goes on, e.g. after saving a half edited requirements.txt
+    try:
+        _run_build_step(step, package_builds)
+    except BuildScriptFailed as e:
+        print(f'Error in building lambdipy build (exit code {e.return_code}), waiting for changes...')
+    except Exception:
+        traceback.print_exc()
+        print('Error in building lambdipy build, waiting for changes...')
+
+
+def _run_build_step(step, package_builds):
+    try:
+        step()
     except NoReleaseCandidate as e:
         print(f'{e.requirement.name} needs to be built but we couldn\'t find a release candidate for {e.requirement.specifiers}')
         available_versions = ', '.join(sorted(list(map(lambda x: x.package_version, package_builds[e.requirement.name]))))
@@ -87,19 +152,46 @@ def build(from_pipenv, dev, include, keep_tests, no_docker):
                 print(log['stream'], end='')
 
 
+@cli.command()
+@click.argument('entries', nargs=-1, required=True)
+@click.option('--allow', '-a', multiple=True, help='Prune unreachable packages under this package (e.g. scipy or '
+                                                   'tensorflow.contrib), others are only reported')
+@click.option('--trace', is_flag=True, help='Also import the entry modules in the lambci/lambda:build-python'
+                                            '{PYTHON_VERSION} container and keep every module that got imported')
+@click.option('--no-docker', '-x', is_flag=True, help='Trace imports without Docker')
+def prune(entries, allow, trace, no_docker):
+    """Report and prune packages in ./build that the ENTRIES modules never import."""
+    prune_unreachable_packages(entries, allow, _python_version(), trace=trace, no_docker=no_docker)
+
+
+@cli.group()
+def mirror():
+    """Manage a local mirror of the prebuilt package releases."""
+    pass
+
+
+@mirror.command()
+@click.argument('directory')
+@click.option('--filter', '-f', help='Only mirror releases whose tag contains this string')
+def sync(directory, filter):
+    use_token = os.environ.get('GITHUB_TOKEN') is not None
+    sync_mirror(directory, filter=filter, use_token=use_token)
+    print(f'Mirror synced to {directory}')
+
+
 @cli.command()
 @click.argument('package')
 @click.option('--tag', '-t')
 @click.option('--verbose', '-v', is_flag=True)
 @click.option('--release', '-r', is_flag=True)
-def prepare(package, tag, verbose, release):
+@click.option('--no-cache', is_flag=True, help='Rebuild the package even if its recipe is in the artifact cache')
+def prepare(package, tag, verbose, release, no_cache):
     release_paths = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'releases/**/**/build*.json')
     package_path = next((path for path in glob.glob(release_paths) if package in path and (tag is None or tag in path)), None)
     package_build = PackageBuild(package_path)
     print(f'Building {package_build}...')
     try:
-        package_build.build_docker(verbose=verbose)
-        package_build.copy_from_docker()
+        package_build.build(verbose=verbose, use_cache=not no_cache)
         print(f'Built {package_build} inside {package_build.build_directory()}')
         if release:
             print('Releasing...')
@@ -117,7 +209,8 @@ def prepare(package, tag, verbose, release):
 @click.option('--filter', '-f')
 @click.option('--parallel-index')
 @click.option('--parallel-total')
-def release(verbose, dry_run, filter, parallel_index, parallel_total):
+@click.option('--no-cache', is_flag=True, help='Rebuild packages even if their recipe is in the artifact cache')
+def release(verbose, dry_run, filter, parallel_index, parallel_total, no_cache):
     release_paths = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'releases/**/**/build*.json')
     for i, path in enumerate(sorted(glob.glob(release_paths))):
         if filter is not None and filter not in path:
@@ -130,11 +223,11 @@ def release(verbose, dry_run, filter, parallel_index, parallel_total):
         # print(open(path).read())
         # print(str(package_build))
         print(f'Checking whether {package_build} is released')
-        if not get_release(package_build, use_token=True):
+        package_release = get_release(package_build, use_token=True)
+        if not package_release:
             try:
                 print(f'{package_build} not released, building...')
-                package_build.build_docker(verbose=verbose)
-                package_build.copy_from_docker()
+                package_build.build(verbose=verbose, use_cache=not no_cache)
                 print(f'Built {package_build} inside {package_build.build_directory()}')
                 if not dry_run:
                     print('Releasing...')
@@ -148,6 +241,10 @@ def release(verbose, dry_run, filter, parallel_index, parallel_total):
                         print(log['stream'], end='')
         else:
             print(f'{package_build} already released, skipping...')
+            released_recipe_hash = get_release_recipe_hash(package_release)
+            if released_recipe_hash and released_recipe_hash != package_build.recipe_hash():
+                print(f'Warning: the recipe of {package_build} changed since it was released, '
+                      'bump its build-version to release the change')
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,46 @@
+import os
+import urllib.request
+from urllib.error import HTTPError
+
+
+from .release import get_releases_data
+
+
+def _is_remote(mirror):
+    return mirror.startswith('http://') or mirror.startswith('https://')
+
+
+def mirror_asset_name(package_build):
+    return f'{package_build.git_tag()}.tar.gz'
+
+
+def fetch_from_mirror(package_build, mirror, download_filename):
+    # mirror is either a local directory or the base URL of a plain HTTP file server
+    asset_name = mirror_asset_name(package_build)
+    if not _is_remote(mirror):
+        path = os.path.join(mirror, asset_name)
+        return path if os.path.isfile(path) else None
+
+    try:
+        urllib.request.urlretrieve(mirror.rstrip('/') + '/' + asset_name, download_filename)
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    return download_filename
+
+
+def sync_mirror(mirror_directory, filter=None, use_token=False):
+    os.makedirs(mirror_directory, exist_ok=True)
+    for release_data in get_releases_data(use_token):
+        tag_name = release_data['tag_name']
+        if filter is not None and filter not in tag_name:
+            continue
+        for asset in release_data['assets']:
+            asset_path = os.path.join(mirror_directory, asset['name'])
+            if os.path.isfile(asset_path) and os.path.getsize(asset_path) == asset['size']:
+                print(f'{asset["name"]} already mirrored, skipping...')
+                continue
+            print(f'Downloading {asset["name"]} from GitHub release {tag_name}')
+            urllib.request.urlretrieve(asset['browser_download_url'], asset_path + '.part')
+            os.replace(asset_path + '.part', asset_path)
@@ -1,5 +1,6 @@
 from collections import defaultdict
 import glob
+import hashlib
 import io
 import json
 import os
@@ -157,10 +158,43 @@ class PackageBuild:
         shutil.rmtree(self.build_directory(), ignore_errors=True)
         os.makedirs(self.build_directory(), exist_ok=True)
 
-        self._run_command_in_docker('bash -c "cp -r prebuilt/* /tmp/export/"')
+        # Export prebuilt packages and libs with a single container run
+        command = 'cp -r prebuilt/* /tmp/export/'
         if len(self.libs_to_copy()) > 0:
             os.mkdir(f'{self.build_directory()}/lib')
-            self._run_command_in_docker(f'bash -c "cp ' + ' '.join(self.libs_to_copy()) + ' /tmp/export/lib"')
+            command += ' && cp ' + ' '.join(self.libs_to_copy()) + ' /tmp/export/lib'
+        self._run_command_in_docker(f'bash -c "{command}"')
+
+    def recipe_hash(self):
+        recipe = json.dumps({'dockerfile': self._dockerfile(), 'libs': self.libs_to_copy()}, sort_keys=True)
+        return hashlib.sha256(recipe.encode('utf-8')).hexdigest()
+
+    def artifact_directory(self):
+        home = os.environ['HOME']
+        return f'{home}/.lambdipy/artifacts/{self.package_name}/{self.recipe_hash()}'
+
+    def restore_from_artifact_cache(self):
+        if not os.path.isdir(self.artifact_directory()):
+            return False
+        shutil.rmtree(self.build_directory(), ignore_errors=True)
+        shutil.copytree(self.artifact_directory(), self.build_directory(), symlinks=True)
+        return True
+
+    def store_in_artifact_cache(self):
+        artifact_directory = self.artifact_directory()
+        temporary_directory = artifact_directory + '.tmp'
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        shutil.copytree(self.build_directory(), temporary_directory, symlinks=True)
+        shutil.rmtree(artifact_directory, ignore_errors=True)
+        os.rename(temporary_directory, artifact_directory)
+
+    def build(self, verbose=False, use_cache=True):
+        if use_cache and self.restore_from_artifact_cache():
+            print(f'Found {self} with recipe hash {self.recipe_hash()[:12]} in artifact cache, skipping docker build')
+            return
+        self.build_docker(verbose=verbose)
+        self.copy_from_docker()
+        self.store_in_artifact_cache()
 
     def create_compressed_tarball(self):
         home = os.environ['HOME']
@@ -2,6 +2,7 @@ import json
 import os
 import shutil
 import stat
+import sys
 import tarfile
 import urllib
 import subprocess
@@ -11,6 +12,7 @@ from requirementslib import Requirement
 from tqdm import tqdm
 
 
+from .mirror import fetch_from_mirror
 from .release import get_release
 
 
@@ -26,6 +28,12 @@ class NoReleaseAsset(Exception):
         self.package_build = package_build
 
 
+class BuildScriptFailed(Exception):
+    def __init__(self, return_code):
+        super(BuildScriptFailed, self).__init__()
+        self.return_code = return_code
+
+
 class ReleaseRequirementsMissmatched(Exception):
     def __init__(self, requirement, potential_candidates):
         super(ReleaseRequirementsMissmatched, self).__init__()
@@ -95,13 +103,17 @@ def resolve_requirements(requirements, package_builds):
     return resolved_requirements
 
 
-def prepare_tarfile(url, download_filename, package_directory):
-    urllib.request.urlretrieve(url, download_filename)
-    tar = tarfile.open(download_filename, "r:gz")
+def extract_tarfile(filename, package_directory):
+    tar = tarfile.open(filename, "r:gz")
     tar.extractall(package_directory)
     tar.close()
 
 
+def prepare_tarfile(url, download_filename, package_directory):
+    urllib.request.urlretrieve(url, download_filename)
+    extract_tarfile(download_filename, package_directory)
+
+
 def download_and_prepare_asset(asset, package_release, package_build):
     url = asset.browser_download_url
     download_directory = os.environ['HOME'] + '/.lambdipy/packages/'
@@ -113,10 +125,22 @@ def download_and_prepare_asset(asset, package_release, package_build):
     return download_directory + '/' + package_build.git_tag()
 
 
+def download_and_prepare_mirrored_package(package_build, mirror):
+    download_directory = os.environ['HOME'] + '/.lambdipy/packages/'
+    os.makedirs(download_directory, exist_ok=True)
+    download_filename = download_directory + package_build.git_tag() + '.tar.gz'
+    tarball_path = fetch_from_mirror(package_build, mirror, download_filename)
+    if not tarball_path:
+        return None
+    print(f'Prepared {package_build.package_name} {package_build.git_tag()} from mirror {mirror}')
+    package_directory = download_directory + '/' + package_build.git_tag()
+    extract_tarfile(tarball_path, package_directory)
+    return package_directory
+
+
 def build_and_prepare_package(package_build):
     print(f'Building {package_build.package_name} build version {package_build.git_tag()}')
-    package_build.build_docker()
-    package_build.copy_from_docker()
+    package_build.build()
     return package_build.build_directory()
 
 
@@ -127,7 +151,7 @@ def find_package_in_cache(package_build):
         return package_directory
 
 
-def prepare_resolved_requirements(resolved_requirements):
+def prepare_resolved_requirements(resolved_requirements, mirror=None):
     package_paths = {}
     for package_name, package_build in resolved_requirements.items():
         if not package_build:
@@ -138,6 +162,15 @@ def prepare_resolved_requirements(resolved_requirements):
             print(f'Found {package_build.package_name} {package_build.git_tag()} in cache')
             continue
 
+        if mirror:
+            mirrored_path = download_and_prepare_mirrored_package(package_build, mirror)
+            if mirrored_path:
+                package_paths[package_name] = mirrored_path
+            else:
+                print(f'{package_build.git_tag()} not found in mirror {mirror}')
+                package_paths[package_name] = build_and_prepare_package(package_build)
+            continue
+
         use_token = os.environ.get('GITHUB_TOKEN') is not None
         package_release = get_release(package_build, use_token)
         if package_release:
@@ -166,73 +199,146 @@ def _copytree(src, dest):
                 shutil.copy2(s, d)
 
 
+def _clear_directory(directory):
+    # Keep the directory itself so that it stays valid as a bind mount of a running build container
+    os.makedirs(directory, exist_ok=True)
+    for item in os.listdir(directory):
+        path = os.path.join(directory, item)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
 def copy_prepared_releases_to_build_directory(package_paths, build_directory='./build'):
-    shutil.rmtree(build_directory, ignore_errors=True)
-    os.makedirs(build_directory, exist_ok=True)
+    _clear_directory(build_directory)
 
     for _, directory in package_paths.items():
         for item in os.listdir(directory):
             _copytree(directory + '/' + item, build_directory + '/' + os.path.basename(item))
 
 
-def _run_command_in_docker(command, build_directory, python_version):
-    volumes = {
-            f'{os.path.abspath(build_directory)}/': {
+class BuildContainer:
+    def __init__(self, build_directory, python_version):
+        self.build_directory = build_directory
+        self.python_version = python_version
+        self.cli = docker.APIClient()
+        self.container_id = None
+
+    def _volumes(self):
+        return {
+            f'{os.path.abspath(self.build_directory)}/': {
                 'bind': '/tmp/export/',
                 'mode': 'rw'
             }
-    }
-    environment = {
-        'HOME': '/home'
-    }
+        }
+
+    def _pull_image(self, image, image_tag):
+        progress_bars = {}
+        pull_generator = self.cli.pull(image, stream=True)
+        for line in (line for output in pull_generator for line in output.decode().split('\n') if len(line) > 0):
+            progress_dict = json.loads(line)
+
+            if 'id' not in progress_dict or progress_dict['id'] == image_tag:
+                print(progress_dict)
+            elif progress_dict['id'] in progress_bars:
+                progress_bar = progress_bars[progress_dict['id']]
+                progress_detail = progress_dict['progressDetail']
+
+                if 'current' in progress_detail:
+                    progress_bar.update(progress_detail['current'] - progress_bar.n)
+                if 'total' in progress_detail and progress_detail['total'] != progress_bar.total:
+                    progress_bar.reset(progress_detail['total'])
+                progress_bar.set_description(progress_dict['id'] + ' | ' + progress_dict['status'])
+            else:
+                progress_bars[progress_dict['id']] = tqdm(desc=progress_dict['id'] + ' | ' + progress_dict['status'])
+
+    def start(self):
+        environment = {
+            'HOME': '/home'
+        }
+
+        image_tag = f'build-python{self.python_version}'
+        image = f'lambci/lambda:{image_tag}'
+        self._pull_image(image, image_tag)
+
+        volumes = self._volumes()
+        container = self.cli.create_container(
+            image,
+            volumes=list(map(lambda x: x['bind'], volumes.values())),
+            host_config=self.cli.create_host_config(binds=volumes),
+            command='sleep infinity',
+            environment=environment,
+            user=f'{os.getuid()}:{os.getgid()}'
+        )
+        self.container_id = container.get('Id')
+        self.cli.start(container=self.container_id)
+
+    def run(self, command):
+        command_exec = self.cli.exec_create(container=self.container_id, cmd=command)
+        command_runtime = self.cli.exec_start(exec_id=command_exec.get('Id'), stream=True)
 
-    cli = docker.APIClient()
+        for line in command_runtime:
+            print(line.decode('utf-8'), end='')
+        return self.cli.exec_inspect(command_exec.get('Id')).get('ExitCode')
 
-    image_tag = f'build-python{python_version}'
-    image = f'lambci/lambda:{image_tag}'
+    def stop(self):
+        if self.container_id is None:
+            return
+        self.cli.kill(self.container_id)
+        self.cli.remove_container(self.container_id)
+        self.container_id = None
 
-    progress_bars = {}
-    pull_generator = cli.pull(image, stream=True)
-    for line in (line for output in pull_generator for line in output.decode().split('\n') if len(line) > 0):
-        progress_dict = json.loads(line)
 
-        if 'id' not in progress_dict or progress_dict['id'] == image_tag:
-            print(progress_dict)
-        elif progress_dict['id'] in progress_bars:
-            progress_bar = progress_bars[progress_dict['id']]
-            progress_detail = progress_dict['progressDetail']
+def _run_command_in_docker(command, build_directory, python_version):
+    container = BuildContainer(build_directory, python_version)
+    container.start()
+    try:
+        container.run(command)
+    finally:
+        container.stop()
 
-            if 'current' in progress_detail:
-                progress_bar.update(progress_detail['current'] - progress_bar.n)
-            if 'total' in progress_detail and progress_detail['total'] != progress_bar.total:
-                progress_bar.reset(progress_detail['total'])
-            progress_bar.set_description(progress_dict['id'] + ' | ' + progress_dict['status'])
-        else:
-            progress_bars[progress_dict['id']] = tqdm(desc=progress_dict['id'] + ' | ' + progress_dict['status'])
-
-    container = cli.create_container(
-        image,
-        volumes=list(map(lambda x: x['bind'], volumes.values())),
-        host_config=cli.create_host_config(binds=volumes),
-        command='sleep infinity',
-        environment=environment,
-        user=f'{os.getuid()}:{os.getgid()}'
-    )
-    cli.start(container=container.get('Id'))
 
+def run_python_script(script, script_name, container=None, build_directory='./build'):
+    # Runs in the running build container or, without one, with the python lambdipy itself runs in
+    with open(build_directory + '/' + script_name, 'w') as f:
+        f.write(script)
     try:
-        command_exec = cli.exec_create(container=container.get('Id'), cmd=command)
-        command_runtime = cli.exec_start(exec_id=command_exec.get('Id'), stream=True)
-
-        for line in command_runtime:
-            print(line.decode('utf-8'), end='')
+        if container is None:
+            return subprocess.Popen([sys.executable, build_directory + '/' + script_name]).wait()
+        return container.run(f'python /tmp/export/{script_name}')
     finally:
-        cli.kill(container.get('Id'))
-        cli.remove_container(container.get('Id'))
+        os.remove(build_directory + '/' + script_name)
+
+
+def _replace_install_commands(packages_to_install, install_dir, protected_names, constraints, build_directory):
+    # pip -t leaves packages already present in the target untouched, so the requirements are installed together with
+    # their dependencies into a staging directory, cleaned up there and moved over everything but the prebuilt releases.
+    # The other pinned requirements are passed as constraints to keep the dependencies in line with a clean build.
+    staging_dir = f'{install_dir}/.lambdipy-staging'
+    constraints_file = '.lambdipy-constraints.txt'
+    with open(build_directory + '/' + constraints_file, 'w') as f:
+        f.writelines(map(lambda x: x + '\n', constraints))
+    protected = ' '.join(protected_names)
+    install_commands = [
+        f'rm -rf {staging_dir}\n',
+        f'pip install {packages_to_install} -c {install_dir}/{constraints_file} -t {staging_dir}\n',
+    ]
+    finalize_commands = [
+        f'for item in {staging_dir}/*; do\n',
+        '  [ -e "$item" ] || continue\n',
+        f'  case " {protected} " in *" $(basename "$item") "*) continue;; esac\n',
+        f'  rm -rf "{install_dir}/$(basename "$item")"\n',
+        f'  mv "$item" {install_dir}/\n',
+        'done\n',
+        f'rm -rf {staging_dir} {install_dir}/{constraints_file}\n',
+    ]
+    return install_commands, staging_dir, finalize_commands
 
 
 def install_non_resolved_requirements(resolved_requirements, requirements, python_version, keep_tests=None, no_docker=False,
-                                      build_directory='./build'):
+                                      build_directory='./build', container=None, replace_existing=False,
+                                      protected_names=(), constraints=()):
     install_dir = build_directory if no_docker else '/tmp/export'
     packages_to_install = ''
     for requirement in requirements:
@@ -241,7 +347,15 @@ def install_non_resolved_requirements(resolved_requirements, requirements, pytho
         requirement_line = requirement['line']
         packages_to_install += f' "{requirement_line}"'
     # GIT_SSH_COMMAND="/usr/bin/ssh -o StrictHostKeyChecking=no"
-    install_command = f'pip install {packages_to_install} -t {install_dir}' if len(packages_to_install) > 0 else ''
+    if replace_existing:
+        if len(packages_to_install) == 0:
+            return
+        # The cleanup only touches the staging directory, ./build may already contain the included paths
+        install_commands, cleanup_dir, finalize_commands = _replace_install_commands(
+            packages_to_install, install_dir, protected_names, constraints, build_directory)
+    else:
+        install_command = f'pip install {packages_to_install} -t {install_dir}' if len(packages_to_install) > 0 else ''
+        install_commands, cleanup_dir, finalize_commands = [install_command + '\n'], install_dir, []
 
     if len(packages_to_install) > 0:
         print(f'Installing remaining packages via pip')
@@ -252,29 +366,33 @@ def install_non_resolved_requirements(resolved_requirements, requirements, pytho
         f.writelines([
             '#!/bin/bash\n',
             'set -ex\n',
-            install_command + '\n',
-            f'rm -rf {install_dir}/*.egg-info\n',
-            f'rm -rf {install_dir}/*.dist-info\n',
-            f'find {install_dir}/ -name __pycache__ | xargs rm -rf\n',
-            f'find {install_dir}/ -name tests | grep -v "{exclude_tests_pattern}" | xargs rm -rf\n',
-            f'find {install_dir}/ -name "*.so" | xargs strip\n'
+            *install_commands,
+            f'rm -rf {cleanup_dir}/*.egg-info\n',
+            f'rm -rf {cleanup_dir}/*.dist-info\n',
+            f'find {cleanup_dir}/ -name __pycache__ | xargs rm -rf\n',
+            f'find {cleanup_dir}/ -name tests | grep -v "{exclude_tests_pattern}" | xargs rm -rf\n',
+            f'find {cleanup_dir}/ -name "*.so" | xargs -r strip\n',
+            *finalize_commands
         ])
     st = os.stat(build_directory + '/build')
     os.chmod(build_directory + '/build', st.st_mode | stat.S_IEXEC)
     print(open(build_directory + '/build').read())
 
+    return_code = 0
     if no_docker:
         print("Installing without docker...")
         return_code = subprocess.Popen([build_directory + '/build']).wait()
-        if return_code != 0:
-            print("Error in building lambdipy build.")
-            exit(return_code)
+    elif container is not None:
+        print("Installing in the running docker container...")
+        return_code = container.run(f'{install_dir}/build')
     else:
         print("Installing in a docker container...")
         _run_command_in_docker(f'{install_dir}/build', build_directory=build_directory, python_version=python_version)
 
-    print('Finalizing the build')
     os.remove(build_directory + '/build')
+    if return_code != 0:
+        raise BuildScriptFailed(return_code)
+    print('Finalizing the build')
 
 
 def copy_include_paths(include_paths, build_directory='./build'):
@@ -1,4 +1,5 @@
 import os
+import re
 
 
 from github import Github, InputGitAuthor
@@ -13,13 +14,17 @@ RELEASE_AUTHOR = os.environ.get('GIT_AUTHOR', 'adikus')
 RELEASE_AUTHOR_EMAIL = os.environ.get('GIT_AUTHOR_EMAIL', 'andrej.hoos@gmail.com')
 
 
-def _get_release_by_tag(tag, use_token):
+def _get_repo(use_token):
     if use_token:
         token = os.environ.get('GITHUB_TOKEN', False) or open('.token').readline().replace('\n', '')
         g = Github(token)
     else:
         g = Github()
-    repo = g.get_user(OWNER).get_repo(REPO)
+    return g.get_user(OWNER).get_repo(REPO)
+
+
+def _get_release_by_tag(tag, use_token):
+    repo = _get_repo(use_token)
     headers, data = repo._requester.requestJsonAndCheck(
         "GET",
         repo.url + f'/releases/tags/{tag}'
@@ -34,6 +39,28 @@ def get_release(build, use_token=False):
         return False
 
 
+def get_release_recipe_hash(package_release):
+    recipe_hash_search = re.search(r'Recipe hash: ([0-9a-f]+)', package_release.body or '')
+    return recipe_hash_search.group(1) if recipe_hash_search else None
+
+
+def get_releases_data(use_token=False):
+    # Raw release listing, it already contains the assets so there is no extra request per release
+    repo = _get_repo(use_token)
+    page = 1
+    while True:
+        headers, data = repo._requester.requestJsonAndCheck(
+            "GET",
+            repo.url + '/releases',
+            parameters={'per_page': 100, 'page': page}
+        )
+        if len(data) == 0:
+            return
+        for release_data in data:
+            yield release_data
+        page += 1
+
+
 def release(build):
     token = os.environ.get('GITHUB_TOKEN', False) or open('.token').readline().replace('\n', '')
     g = Github(token)
@@ -46,7 +73,7 @@ def release(build):
         tag=build.git_tag(),
         tag_message=message,
         release_name=f'Prebuilt package of {build.package_name} {build.package_version}',
-        release_message=message,
+        release_message=f'{message}\n\nRecipe hash: {build.recipe_hash()}',
         object=commit,
         type='commit',
         tagger=author
@@ -0,0 +1,292 @@
+import ast
+import json
+import os
+import shutil
+
+
+from .project_build import BuildContainer, run_python_script
+
+
+TRACE_OUTPUT = '_lambdipy_trace.json'
+
+TRACE_SCRIPT = '''import importlib
+import json
+import os
+import sys
+
+build_directory = os.path.dirname(os.path.abspath(__file__))
+for name in {entries!r}:
+    importlib.import_module(name)
+modules = [name for name, module in list(sys.modules.items())
+           if getattr(module, '__file__', None) and
+           os.path.abspath(module.__file__).startswith(os.path.join(build_directory, ''))]
+with open(os.path.join(build_directory, {output!r}), 'w') as f:
+    json.dump(modules, f)
+'''
+
+IMPORT_FUNCTIONS = ('import_module', '__import__')
+
+
+def _contains_python(directory):
+    for _, _, files in os.walk(directory):
+        if any(name.endswith(('.py', '.so', '.pyd')) for name in files):
+            return True
+    return False
+
+
+def _is_package_directory(path, name):
+    if not os.path.isdir(path) or not name.isidentifier() or name == '__pycache__':
+        return False
+    # Directories without __init__.py are namespace packages (e.g. google/ of protobuf) as long as they contain modules
+    return os.path.isfile(os.path.join(path, '__init__.py')) or _contains_python(path)
+
+
+def _index_package(directory, package_name, modules, packages):
+    packages.add(package_name)
+    # Namespace packages have no module of their own, they are indexed by their directory
+    modules[package_name] = directory
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if _is_package_directory(path, name):
+            _index_package(path, f'{package_name}.{name}', modules, packages)
+        elif name == '__init__.py':
+            modules[package_name] = path
+        elif name.endswith('.py'):
+            modules[f'{package_name}.{name[:-3]}'] = path
+        elif name.endswith(('.so', '.pyd')):
+            modules[f'{package_name}.{name.split(".")[0]}'] = path
+
+
+def _module_index(build_directory):
+    modules = {}
+    packages = set()
+    for name in os.listdir(build_directory):
+        path = os.path.join(build_directory, name)
+        if _is_package_directory(path, name):
+            _index_package(path, name, modules, packages)
+        elif name.endswith('.py'):
+            modules[name[:-3]] = path
+        elif name.endswith(('.so', '.pyd')):
+            modules[name.split('.')[0]] = path
+    return modules, packages
+
+
+def _string_value(node):
+    # ast.Str (python < 3.8) has `s`, ast.Constant has `value`
+    value = getattr(node, 'value', getattr(node, 's', None))
+    return value if isinstance(value, str) else None
+
+
+def _relative_name(anchor, level, name):
+    anchor_parts = anchor.split('.')
+    base = '.'.join(anchor_parts[:len(anchor_parts) - level + 1])
+    if not name:
+        return base
+    return f'{base}.{name}' if base else name
+
+
+def _literal_prefix(node):
+    # The constant start of a computed module name, e.g. 'pkg.' of 'pkg.' + name or f'pkg.{name}'
+    value = _string_value(node)
+    if value is not None:
+        return value
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _literal_prefix(node.left)
+    if isinstance(node, ast.JoinedStr) and len(node.values) > 0:
+        return _string_value(node.values[0])
+    if isinstance(node, ast.Call) and getattr(node.func, 'attr', None) == 'format':
+        template = _string_value(getattr(node.func, 'value', None))
+        return template.split('{')[0] if template is not None else None
+    return None
+
+
+def _import_module_anchor(node, module_name, package):
+    anchors = node.args[1:2] + [keyword.value for keyword in node.keywords if keyword.arg == 'package']
+    if len(anchors) == 0:
+        return None
+    if isinstance(anchors[0], ast.Name) and anchors[0].id == '__name__':
+        return module_name
+    if isinstance(anchors[0], ast.Name) and anchors[0].id == '__package__':
+        return package
+    return _string_value(anchors[0])
+
+
+def _imported_names(module_name, path, is_package):
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), path)
+
+    package = module_name if is_package else module_name.rpartition('.')[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                base = _relative_name(package, node.level, node.module)
+            else:
+                base = node.module
+            names.append(base)
+            for alias in node.names:
+                names.append(f'{base}.{alias.name}')
+        elif isinstance(node, ast.Call) and len(node.args) > 0:
+            function_name = getattr(node.func, 'attr', getattr(node.func, 'id', None))
+            if function_name not in IMPORT_FUNCTIONS:
+                continue
+            argument = _string_value(node.args[0])
+            if argument is not None and not argument.startswith('.'):
+                names.append(argument)
+                continue
+
+            # Relative or computed module names. A computed name keeps the whole subtree of its constant package
+            # prefix, or of the current package without one.
+            prefix = argument if argument is not None else _literal_prefix(node.args[0])
+            if prefix and prefix.startswith('.'):
+                anchor = _import_module_anchor(node, module_name, package) if function_name == 'import_module' else None
+                level = len(prefix) - len(prefix.lstrip('.'))
+                prefix = f'{_relative_name(anchor, level, "")}.{prefix[level:]}' if anchor else None
+            if argument is not None and prefix:
+                names.append(prefix.rstrip('.'))
+            elif prefix and '.' in prefix:
+                names.append(f'{prefix.rpartition(".")[0]}.**')
+            elif package:
+                names.append(f'{package}.**')
+            else:
+                # Could import anything, mark the module as not analysable
+                names.append('**')
+    return names
+
+
+def find_reachable_modules(entries, build_directory='./build', traced_modules=()):
+    """Return the modules reachable from entries and the reachable modules whose imports couldn't be analysed."""
+    modules, packages = _module_index(build_directory)
+    reachable = set()
+    unanalysed = set()
+    queue = []
+
+    def reach(name):
+        # Importing a module imports all of its parent packages as well
+        parts = name.split('.')
+        for i in range(1, len(parts) + 1):
+            prefix = '.'.join(parts[:i])
+            if prefix in modules and prefix not in reachable:
+                reachable.add(prefix)
+                queue.append(prefix)
+
+    def reach_subtree(package):
+        for name in modules:
+            if name == package or name.startswith(package + '.'):
+                reach(name)
+
+    for name in list(entries) + list(traced_modules):
+        reach(name)
+
+    while len(queue) > 0:
+        name = queue.pop()
+        path = modules[name]
+        if os.path.isdir(path):
+            continue
+        if not path.endswith('.py'):
+            # Imports of extension modules can't be analysed, keep their whole package
+            package = name.rpartition('.')[0]
+            if package:
+                reach_subtree(package)
+            else:
+                unanalysed.add(name)
+            continue
+
+        try:
+            imported_names = _imported_names(name, path, name in packages)
+        except (SyntaxError, ValueError):
+            # e.g. python 2 only sources
+            unanalysed.add(name)
+            reach_subtree(name.split('.')[0])
+            continue
+
+        for imported_name in imported_names:
+            if imported_name == '**':
+                unanalysed.add(name)
+            elif imported_name.endswith('.**'):
+                reach_subtree(imported_name[:-3])
+            elif imported_name.endswith('.*'):
+                # `from package import *` may import any submodule listed in __all__
+                package = imported_name[:-2]
+                for other in list(modules):
+                    if other.rpartition('.')[0] == package:
+                        reach(other)
+                reach(package)
+            else:
+                reach(imported_name)
+
+    return reachable, unanalysed
+
+
+def find_unreachable_packages(reachable, build_directory='./build'):
+    _, packages = _module_index(build_directory)
+    unreachable = []
+    for package in sorted(packages):
+        parent = package.rpartition('.')[0]
+        # A reachable module makes all of its parents reachable, so only the topmost unreachable package is reported
+        if package not in reachable and (not parent or parent in reachable):
+            unreachable.append(package)
+    return unreachable
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(directory) for name in files)
+
+
+def _trace_imports(entries, python_version, no_docker=False, build_directory='./build'):
+    container = None if no_docker else BuildContainer(build_directory, python_version)
+    if container is not None:
+        container.start()
+    try:
+        print(f'Tracing imports of {", ".join(entries)}')
+        return_code = run_python_script(TRACE_SCRIPT.format(entries=list(entries), output=TRACE_OUTPUT),
+                                        '_lambdipy_trace.py', container, build_directory)
+        if return_code != 0:
+            print('Error in tracing imports.')
+            exit(return_code)
+    finally:
+        if container is not None:
+            container.stop()
+
+    trace_path = os.path.join(build_directory, TRACE_OUTPUT)
+    with open(trace_path) as f:
+        traced_modules = json.load(f)
+    os.remove(trace_path)
+    return traced_modules
+
+
+def prune_unreachable_packages(entries, allowed, python_version, trace=False, no_docker=False,
+                               build_directory='./build'):
+    entries = list(map(lambda x: x[:-3] if x.endswith('.py') else x, entries))
+    modules, _ = _module_index(build_directory)
+    missing_entries = [entry for entry in entries if entry not in modules]
+    if len(missing_entries) > 0:
+        print(f'Entry modules {", ".join(missing_entries)} not found in {build_directory}')
+        exit(1)
+
+    traced_modules = _trace_imports(entries, python_version, no_docker, build_directory) if trace else []
+    reachable, unanalysed = find_reachable_modules(entries, build_directory, traced_modules)
+    if len(unanalysed) > 0:
+        print(f'Imports of {", ".join(sorted(unanalysed))} can\'t be analysed statically')
+        if trace:
+            print('Relying on the traced imports for them')
+        else:
+            print('Only reporting unreachable packages, use --trace to prune based on the imports of a real run')
+            allowed = ()
+
+    pruned_size = 0
+    unreachable = find_unreachable_packages(reachable, build_directory)
+    for package in unreachable:
+        path = os.path.join(build_directory, *package.split('.'))
+        size = _directory_size(path)
+        if any(package == prefix or package.startswith(prefix + '.') for prefix in allowed):
+            shutil.rmtree(path)
+            pruned_size += size
+            print(f'Pruned {package} ({size // 1024} KiB)')
+        else:
+            print(f'Unreachable {package} ({size // 1024} KiB)')
+
+    print(f'Found {len(unreachable)} unreachable packages, pruned {pruned_size // 1024} KiB')
+    return unreachable
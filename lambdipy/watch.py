@@ -0,0 +1,143 @@
+import os
+import shutil
+
+
+from .project_build import BuildContainer, resolve_requirements, prepare_resolved_requirements
+from .project_build import copy_prepared_releases_to_build_directory, install_non_resolved_requirements
+from .project_build import copy_include_paths
+
+
+def _file_mtimes(paths):
+    mtimes = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    mtimes[file_path] = os.stat(file_path).st_mtime_ns
+        elif os.path.isfile(path):
+            mtimes[path] = os.stat(path).st_mtime_ns
+    return mtimes
+
+
+def _changed_paths(old_mtimes, new_mtimes):
+    return {path for path in set(old_mtimes) | set(new_mtimes) if old_mtimes.get(path) != new_mtimes.get(path)}
+
+
+def _prebuilt_tags(resolved_requirements):
+    return {name: build.git_tag() for name, build in resolved_requirements.items() if build}
+
+
+def _include_destination(include_path, file_path, build_directory):
+    basename = os.path.basename(include_path)
+    if len(basename) == 0:
+        basename = include_path
+    if file_path == include_path:
+        return build_directory + '/' + basename
+    return build_directory + '/' + basename + '/' + os.path.relpath(file_path, include_path)
+
+
+class ProjectWatcher:
+    def __init__(self, load_requirements, requirements_paths, include_paths, package_builds, python_version,
+                 keep_tests=None, no_docker=False, mirror=None, build_directory='./build'):
+        self.load_requirements = load_requirements
+        self.requirements_paths = requirements_paths
+        self.include_paths = include_paths
+        self.package_builds = package_builds
+        self.python_version = python_version
+        self.keep_tests = keep_tests
+        self.no_docker = no_docker
+        self.mirror = mirror
+        self.build_directory = build_directory
+
+        self.container = None
+        self.prebuilt_names = set()
+        self.requirements = None
+        self.resolved_requirements = None
+        self.requirements_mtimes = {}
+        self.include_mtimes = {}
+
+    def _install(self, requirements, replace_existing=False, constraints=()):
+        install_non_resolved_requirements(self.resolved_requirements, requirements, self.python_version,
+                                          self.keep_tests, self.no_docker, self.build_directory,
+                                          container=self.container, replace_existing=replace_existing,
+                                          protected_names=self.prebuilt_names, constraints=constraints)
+
+    def build(self):
+        self.requirements = None
+        self.requirements_mtimes = _file_mtimes(self.requirements_paths)
+        self.include_mtimes = _file_mtimes(self.include_paths)
+
+        os.makedirs(self.build_directory, exist_ok=True)
+        if not self.no_docker and self.container is None:
+            self.container = BuildContainer(self.build_directory, self.python_version)
+            self.container.start()
+
+        requirements = self.load_requirements()
+        self.resolved_requirements = resolve_requirements(requirements, self.package_builds)
+        package_paths = prepare_resolved_requirements(self.resolved_requirements, mirror=self.mirror)
+        copy_prepared_releases_to_build_directory(package_paths, self.build_directory)
+        self.prebuilt_names = {item for directory in package_paths.values() for item in os.listdir(directory)}
+        self._install(requirements)
+        copy_include_paths(self.include_paths, self.build_directory)
+        self.requirements = requirements
+        print('Build done')
+
+    def _update_requirements(self):
+        if self.requirements is None:
+            self.build()
+            return True
+
+        requirements = self.load_requirements()
+        resolved_requirements = resolve_requirements(requirements, self.package_builds)
+        # A different set of prebuilt releases or a removed requirement can't be applied in place
+        if _prebuilt_tags(resolved_requirements) != _prebuilt_tags(self.resolved_requirements):
+            print('Resolved packages changed, rebuilding...')
+            self.build()
+            return True
+        if len(set(self.resolved_requirements) - set(resolved_requirements)) > 0:
+            print('Requirements removed, rebuilding...')
+            self.build()
+            return True
+
+        self.resolved_requirements = resolved_requirements
+        previous_lines = set(map(lambda x: x['line'], self.requirements))
+        changed_requirements = list(filter(lambda x: x['line'] not in previous_lines, requirements))
+        if len(changed_requirements) > 0:
+            print(f'Reinstalling {", ".join(map(lambda x: x["line"], changed_requirements))}')
+            constraints = [requirement['line'] for requirement in requirements
+                           if (requirement['requirement'].specifiers or '').startswith('==')]
+            self._install(changed_requirements, replace_existing=True, constraints=constraints)
+        self.requirements = requirements
+        return False
+
+    def _update_include_paths(self, changed_paths):
+        for file_path in sorted(changed_paths):
+            include_path = next(path for path in self.include_paths
+                                if file_path == path or file_path.startswith(os.path.join(path, '')))
+            destination = _include_destination(include_path, file_path, self.build_directory)
+            if os.path.isfile(file_path):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copy2(file_path, destination)
+                print(f'Updated {destination}')
+            elif os.path.isfile(destination):
+                os.remove(destination)
+                print(f'Removed {destination}')
+
+    def update(self):
+        requirements_mtimes = _file_mtimes(self.requirements_paths)
+        include_mtimes = _file_mtimes(self.include_paths)
+        changed_requirements_paths = _changed_paths(self.requirements_mtimes, requirements_mtimes)
+        changed_include_paths = _changed_paths(self.include_mtimes, include_mtimes)
+        self.requirements_mtimes = requirements_mtimes
+        self.include_mtimes = include_mtimes
+
+        if len(changed_requirements_paths) > 0 and self._update_requirements():
+            return
+        if len(changed_include_paths) > 0:
+            self._update_include_paths(changed_include_paths)
+
+    def close(self):
+        if self.container is not None:
+            self.container.stop()
+            self.container = None
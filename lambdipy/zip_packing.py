@@ -0,0 +1,150 @@
+import os
+import shutil
+
+
+from .project_build import BuildContainer, run_python_script
+
+
+ZIP_ARCHIVE = 'lambdipy-packages.zip'
+ZIP_BOOTSTRAP = 'lambdipy_zipimport.py'
+
+# Both scripts run with the Lambda python version (inside the lambci container) so that the
+# precompiled modules in the archive match the runtime, hence they stay python 2.7 compatible.
+PACK_SCRIPT = '''import os
+import zipfile
+
+build_directory = os.path.dirname(os.path.abspath(__file__))
+archive = zipfile.PyZipFile(os.path.join(build_directory, {archive!r}), 'w', zipfile.ZIP_DEFLATED)
+for name in {names!r}:
+    path = os.path.join(build_directory, name)
+    archive.writepy(path)
+    for root, dirs, files in os.walk(path) if os.path.isdir(path) else []:
+        dirs[:] = [directory for directory in dirs if directory != '__pycache__']
+        for file_name in files:
+            if not file_name.endswith(('.py', '.pyc')):
+                file_path = os.path.join(root, file_name)
+                archive.write(file_path, os.path.relpath(file_path, build_directory))
+archive.close()
+'''
+
+VERIFY_SCRIPT = '''import importlib
+import os
+import sys
+import traceback
+
+build_directory = os.path.dirname(os.path.abspath(__file__))
+archive_path = os.path.join(build_directory, {archive!r})
+sys.path.insert(1, archive_path)
+failed = False
+for name in {names!r}:
+    try:
+        module = importlib.import_module(name)
+        if not getattr(module, '__file__', '').startswith(archive_path):
+            raise ImportError(name + ' was not imported from ' + archive_path)
+        print('OK ' + name)
+    except Exception:
+        failed = True
+        print('FAILED ' + name)
+        traceback.print_exc()
+sys.exit(1 if failed else 0)
+'''
+
+# The archive goes right after the bundle directory so that the packed packages keep precedence over the
+# copies shipped with the Lambda runtime (e.g. six or urllib3 in /var/runtime), just like unpacked ones do.
+BOOTSTRAP = '''import os
+import sys
+
+_bundle_directory = os.path.dirname(os.path.abspath(__file__))
+_archive_path = os.path.join(_bundle_directory, {archive!r})
+if _archive_path not in sys.path:
+    _bundle_indexes = [i for i, path in enumerate(sys.path) if os.path.abspath(path or '.') == _bundle_directory]
+    sys.path.insert(_bundle_indexes[0] + 1 if _bundle_indexes else 0, _archive_path)
+'''
+
+
+def _is_zip_safe_source(path):
+    with open(path, 'rb') as f:
+        return b'__file__' not in f.read()
+
+
+def _is_zip_safe_package(package_directory):
+    if not os.path.isfile(os.path.join(package_directory, '__init__.py')):
+        return False
+    for root, _, files in os.walk(package_directory):
+        for name in files:
+            if name.endswith(('.so', '.pyd')):
+                return False
+            if name.endswith('.py') and not _is_zip_safe_source(os.path.join(root, name)):
+                return False
+        if any(name.endswith('.py') for name in files):
+            # zipfile.PyZipFile only descends into subpackages, modules anywhere else would be lost
+            directory = root
+            while directory != package_directory:
+                if not os.path.isfile(os.path.join(directory, '__init__.py')):
+                    return False
+                directory = os.path.dirname(directory)
+    return True
+
+
+def find_zip_safe_packages(build_directory='./build'):
+    names = []
+    for name in sorted(os.listdir(build_directory)):
+        path = os.path.join(build_directory, name)
+        if name.startswith(('.', 'lambdipy')) or name == 'build':
+            continue
+        if os.path.isdir(path) and _is_zip_safe_package(path):
+            names.append(name)
+        elif name.endswith('.py') and _is_zip_safe_source(path):
+            names.append(name)
+    return names
+
+
+def _module_name(name):
+    return name[:-3] if name.endswith('.py') else name
+
+
+def pack_zip_safe_packages(python_version, no_docker=False, verify=False, build_directory='./build'):
+    names = find_zip_safe_packages(build_directory)
+    if len(names) == 0:
+        print('No zip safe packages found')
+        return names
+
+    print(f'Packing {", ".join(names)} into {ZIP_ARCHIVE}')
+    container = None if no_docker else BuildContainer(build_directory, python_version)
+    if container is not None:
+        container.start()
+    try:
+        return_code = run_python_script(PACK_SCRIPT.format(archive=ZIP_ARCHIVE, names=names), '_lambdipy_pack.py',
+                                         container, build_directory)
+        if return_code != 0:
+            print('Error in packing zip safe packages.')
+            exit(return_code)
+
+        for name in names:
+            path = os.path.join(build_directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+                # zipfile.PyZipFile of python 2.7 compiles top level modules to a .pyc next to them
+                if os.path.isfile(path + 'c'):
+                    os.remove(path + 'c')
+        with open(os.path.join(build_directory, ZIP_BOOTSTRAP), 'w') as f:
+            f.write(BOOTSTRAP.format(archive=ZIP_ARCHIVE))
+
+        if verify:
+            print('Verifying packed packages')
+            module_names = list(map(_module_name, names))
+            return_code = run_python_script(VERIFY_SCRIPT.format(archive=ZIP_ARCHIVE, names=module_names),
+                                             '_lambdipy_verify.py', container, build_directory)
+            if return_code != 0:
+                print('Some packed packages could not be imported from the zip archive.')
+                exit(return_code)
+    finally:
+        if container is not None:
+            container.stop()
+        # zipfile.PyZipFile of python 3 compiles top level modules into __pycache__
+        shutil.rmtree(os.path.join(build_directory, '__pycache__'), ignore_errors=True)
+
+    print(f'Packed {len(names)} packages, import {ZIP_BOOTSTRAP[:-3]} in your handler before your dependencies')
+    return names
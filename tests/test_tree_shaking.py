@@ -0,0 +1,121 @@
+import pytest
+from lambdipy.tree_shaking import _relative_name, find_reachable_modules, find_unreachable_packages
+
+
+def _write(path, content=''):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+@pytest.fixture
+def build_directory(tmp_path):
+    for package in ['pkg', 'pkg/used', 'pkg/unused', 'pkg/unused/deep', 'other']:
+        _write(tmp_path / package / '__init__.py')
+    return tmp_path
+
+
+def _analyse(build_directory, handler, entries=('handler',)):
+    _write(build_directory / 'handler.py', handler)
+    reachable, unanalysed = find_reachable_modules(entries, str(build_directory))
+    return reachable, unanalysed, find_unreachable_packages(reachable, str(build_directory))
+
+
+def test_relative_name():
+    assert _relative_name('a.b', 1, 'c') == 'a.b.c'
+    assert _relative_name('a.b', 2, 'c') == 'a.c'
+    assert _relative_name('a.b', 2, None) == 'a'
+
+
+def test_reports_topmost_unreachable_packages(build_directory):
+    reachable, unanalysed, unreachable = _analyse(build_directory, 'import pkg.used\n')
+    assert {'handler', 'pkg', 'pkg.used'} <= reachable
+    assert unanalysed == set()
+    assert unreachable == ['other', 'pkg.unused']
+
+
+def test_relative_imports(build_directory):
+    _write(build_directory / 'pkg' / '__init__.py', 'from . import used\n')
+    _write(build_directory / 'pkg' / 'used' / '__init__.py', 'from ..unused import deep\n')
+    _, _, unreachable = _analyse(build_directory, 'import pkg\n')
+    assert unreachable == ['other']
+
+
+def test_import_module_relative_to_name_and_package(build_directory):
+    _write(build_directory / 'pkg' / '__init__.py', 'import importlib\n'
+                                                    'importlib.import_module(".used", __name__)\n'
+                                                    'importlib.import_module("..unused", package="pkg.used")\n')
+    _write(build_directory / 'pkg' / 'used' / 'mod.py', 'from importlib import import_module\n'
+                                                        'import_module("..other_mod", __package__)\n')
+    _write(build_directory / 'pkg' / 'other_mod.py')
+    reachable, _, unreachable = _analyse(build_directory, 'import pkg.used.mod\n')
+    assert 'pkg.other_mod' in reachable
+    assert unreachable == ['other', 'pkg.unused.deep']
+
+
+def test_star_import_reaches_direct_submodules(build_directory):
+    _write(build_directory / 'pkg' / 'used' / 'mod.py')
+    reachable, _, unreachable = _analyse(build_directory, 'from pkg import *\n')
+    assert {'pkg.used', 'pkg.unused'} <= reachable
+    assert 'pkg.used.mod' not in reachable
+    assert unreachable == ['other', 'pkg.unused.deep']
+
+
+def test_computed_import_keeps_prefix_package(build_directory):
+    _write(build_directory / 'pkg' / '__init__.py', 'import importlib\n'
+                                                    'def __getattr__(name):\n'
+                                                    '    return importlib.import_module("pkg." + name)\n')
+    reachable, unanalysed, unreachable = _analyse(build_directory, 'import pkg\n')
+    assert unanalysed == set()
+    assert unreachable == ['other']
+
+
+def test_computed_import_without_prefix_keeps_current_package(build_directory):
+    _write(build_directory / 'pkg' / 'used' / '__init__.py', 'import importlib\n'
+                                                             'def load(name):\n'
+                                                             '    return importlib.import_module(name)\n')
+    _write(build_directory / 'pkg' / 'used' / 'backend.py')
+    reachable, unanalysed, unreachable = _analyse(build_directory, 'import pkg.used\n')
+    assert 'pkg.used.backend' in reachable
+    assert unanalysed == set()
+    assert unreachable == ['other', 'pkg.unused']
+
+
+def test_computed_import_in_top_level_module_is_not_analysable(build_directory):
+    _, unanalysed, _ = _analyse(build_directory, 'import importlib\nimportlib.import_module(NAME)\n')
+    assert unanalysed == {'handler'}
+
+
+def test_namespace_packages_are_analysed(build_directory):
+    _write(build_directory / 'ns' / 'inner' / 'x.py', 'import other\n')
+    _write(build_directory / 'ns' / 'unused' / 'y.py')
+    reachable, unanalysed, unreachable = _analyse(build_directory, 'import ns.inner.x\n')
+    assert {'ns', 'ns.inner', 'ns.inner.x', 'other'} <= reachable
+    assert unanalysed == set()
+    assert unreachable == ['ns.unused', 'pkg']
+
+
+def test_data_directories_are_not_packages(build_directory):
+    _write(build_directory / 'pkg' / 'data' / 'values.csv', '1,2')
+    _, _, unreachable = _analyse(build_directory, 'import pkg.used\nimport pkg.unused\n')
+    assert unreachable == ['other', 'pkg.unused.deep']
+
+
+def test_top_level_extension_modules_are_not_analysable(build_directory):
+    _write(build_directory / '_ext.cpython-36m-x86_64-linux-gnu.so')
+    _, unanalysed, _ = _analyse(build_directory, 'import _ext\n')
+    assert unanalysed == {'_ext'}
+
+
+def test_package_extension_modules_keep_their_package(build_directory):
+    _write(build_directory / 'pkg' / 'used' / '_ext.so')
+    _write(build_directory / 'pkg' / 'used' / 'helper' / '__init__.py')
+    reachable, unanalysed, _ = _analyse(build_directory, 'from pkg.used import _ext\n')
+    assert 'pkg.used.helper' in reachable
+    assert unanalysed == set()
+
+
+def test_unparseable_modules_are_not_analysable(build_directory):
+    _write(build_directory / 'pkg' / 'used' / '__init__.py', 'print "python 2"\n')
+    reachable, unanalysed, unreachable = _analyse(build_directory, 'import pkg.used\n')
+    assert unanalysed == {'pkg.used'}
+    assert unreachable == ['other']
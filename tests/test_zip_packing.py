@@ -0,0 +1,59 @@
+import pytest
+from click.testing import CliRunner
+from lambdipy import cli
+from lambdipy.zip_packing import find_zip_safe_packages
+
+
+def _write(path, content=''):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+@pytest.fixture
+def build_directory(tmp_path):
+    _write(tmp_path / 'pure' / '__init__.py', 'from .sub import x\n')
+    _write(tmp_path / 'pure' / 'sub' / '__init__.py', 'x = 1\n')
+    _write(tmp_path / 'pure' / 'sub' / 'data.txt', 'data')
+    return tmp_path
+
+
+def test_pure_package_is_zip_safe(build_directory):
+    assert find_zip_safe_packages(str(build_directory)) == ['pure']
+
+
+def test_package_with_shared_object_is_not_zip_safe(build_directory):
+    _write(build_directory / 'binary' / '__init__.py')
+    _write(build_directory / 'binary' / 'core' / '__init__.py')
+    _write(build_directory / 'binary' / 'core' / '_ext.cpython-36m-x86_64-linux-gnu.so')
+    assert find_zip_safe_packages(str(build_directory)) == ['pure']
+
+
+def test_package_using_file_is_not_zip_safe(build_directory):
+    _write(build_directory / 'data' / '__init__.py')
+    _write(build_directory / 'data' / 'loader.py', 'import os\nPATH = os.path.dirname(__file__)\n')
+    assert find_zip_safe_packages(str(build_directory)) == ['pure']
+
+
+def test_directories_without_init_are_not_zip_safe(build_directory):
+    _write(build_directory / 'namespace' / 'module.py', 'x = 1\n')
+    _write(build_directory / 'nested' / '__init__.py')
+    _write(build_directory / 'nested' / 'scripts' / 'module.py', 'x = 1\n')
+    assert find_zip_safe_packages(str(build_directory)) == ['pure']
+
+
+def test_top_level_modules(build_directory):
+    _write(build_directory / 'six.py', 'x = 1\n')
+    _write(build_directory / 'uses_file.py', 'PATH = __file__\n')
+    assert find_zip_safe_packages(str(build_directory)) == ['pure', 'six.py']
+
+
+def test_skips_lambdipy_files_and_hidden_entries(build_directory):
+    _write(build_directory / 'lambdipy_zipimport.py')
+    _write(build_directory / '.hidden' / '__init__.py')
+    assert find_zip_safe_packages(str(build_directory)) == ['pure']
+
+
+def test_verify_zip_requires_zip_packages():
+    result = CliRunner().invoke(cli.build, ['--verify-zip'])
+    assert result.exit_code == 2
+    assert '--verify-zip requires --zip-packages' in result.output